@@ -1,8 +1,105 @@
 from django.contrib import admin
-from .models import Tag, Story, Chapter, Comment, Rating
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 
-admin.site.register(Tag)
-admin.site.register(Story)
-admin.site.register(Chapter)
-admin.site.register(Comment)
-admin.site.register(Rating)
\ No newline at end of file
+from .models import Tag, CoverImage, Story, StoryTag, Chapter, ChapterRevision, Comment, Rating
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables. On Postgres an unfiltered changelist uses
+    the planner's row estimate (pg_class.reltuples) instead of COUNT(*);
+    filtered lists, small tables and other databases get an exact count.
+    """
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            connection = connections[qs.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [qs.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.estimate_threshold:
+                    return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # skip the second, unfiltered COUNT(*)
+    list_per_page = 50
+    # Walk the primary key instead of a model's Meta.ordering, which has no
+    # index on its own and would sort the whole table for every page.
+    ordering = ("-id",)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ("name",)
+    search_fields = ("name",)
+
+
+@admin.register(CoverImage)
+class CoverImageAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "width", "height", "size", "status", "created_at")
+    list_filter = ("status",)
+    search_fields = ("=sha256",)
+
+
+class StoryTagInline(admin.TabularInline):
+    model = StoryTag
+    extra = 0
+    autocomplete_fields = ("tag",)
+
+
+@admin.register(Story)
+class StoryAdmin(admin.ModelAdmin):
+    list_display = ("title", "author", "status", "created_at")
+    list_select_related = ("author",)
+    list_filter = ("status",)
+    search_fields = ("title", "=author__username")
+    autocomplete_fields = ("author",)
+    raw_id_fields = ("cover",)
+    inlines = [StoryTagInline]
+
+
+@admin.register(Chapter)
+class ChapterAdmin(LargeTableAdmin):
+    list_display = ("title", "story", "position", "updated_at")
+    list_select_related = ("story",)
+    search_fields = ("title", "story__title")
+    autocomplete_fields = ("story",)
+
+
+@admin.register(ChapterRevision)
+class ChapterRevisionAdmin(LargeTableAdmin):
+    list_display = ("chapter", "number", "is_snapshot", "size", "editor", "created_at")
+    list_select_related = ("chapter__story", "editor")
+    raw_id_fields = ("chapter", "editor")
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "chapter", "created_at")
+    list_select_related = ("user", "chapter__story")
+    list_filter = (("created_at", admin.DateFieldListFilter),)
+    # Exact-match lookups only: both are indexed, a LIKE over comment text is not.
+    search_fields = ("=user__username", "=chapter__id")
+    raw_id_fields = ("user", "chapter", "parent")
+
+
+@admin.register(Rating)
+class RatingAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "chapter", "value", "created_at")
+    list_select_related = ("user", "chapter__story")
+    list_filter = ("value", ("created_at", admin.DateFieldListFilter))
+    search_fields = ("=user__username", "=chapter__id")
+    raw_id_fields = ("user", "chapter")
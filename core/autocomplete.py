@@ -0,0 +1,300 @@
+# core/autocomplete.py
+"""
+In-memory prefix index for the search box typeahead.
+
+Each worker lazily builds one PrefixIndex over tag names, story titles and
+author usernames. It is a sorted array of (key, kind, id) tuples: a lookup is a
+bisect to the first key >= the prefix and a walk while keys still match.
+Story titles are indexed at every word start, so "inn" finds "The Wandering Inn".
+Results are ranked by popularity:
+  tag    -> number of stories using it
+  story  -> follower_count
+  author -> followers summed over their stories
+Prefixes of up to SHORT_PREFIX characters match most of the index, so their
+rankings are precomputed at build time and kept up to date in place on every
+change. Longer prefixes are ranked on first use, cached, and invalidated only
+when a matching key changes. Model signals (core/signals.py) and follow/unfollow
+(core/feed.py) keep the index current through apply_change(). As a safety net
+the index is rebuilt every AUTOCOMPLETE_REBUILD_SECONDS on a background thread
+and swapped in atomically; lookups never wait for a rebuild after the first.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+
+from .models import Story, Tag
+
+KINDS = ("tag", "story", "author")
+MAX_LIMIT = 20
+MAX_CACHED_PREFIXES = 10_000
+SHORT_PREFIX = 3
+# Precomputed rankings keep some spare entries, so a result leaving the top
+# MAX_LIMIT seldom forces a rescan of its prefix.
+TOP_KEEP = 2 * MAX_LIMIT
+REBUILD_SECONDS = getattr(settings, "AUTOCOMPLETE_REBUILD_SECONDS", 600)
+
+
+def normalize(text):
+    return " ".join((text or "").casefold().split())
+
+
+def _keys(kind, label):
+    norm = normalize(label)
+    if not norm:
+        return []
+    if kind != "story":
+        return [norm]
+    words = norm.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _short_prefixes(keys):
+    return {key[:end] for key in keys for end in range(1, min(len(key), SHORT_PREFIX) + 1)}
+
+
+def _rank_key(pk, item):
+    # Most popular first, then alphabetical; id keeps the order total.
+    return (-item[1], item[0], pk)
+
+
+def _top_slot(ranks):
+    """[best TOP_KEEP rank keys, whether that is every match]"""
+    return [heapq.nsmallest(TOP_KEEP, ranks), len(ranks) <= TOP_KEEP]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._keys = []    # sorted [(key, kind, id)]
+        self._items = {}   # (kind, id) -> [label, score, keys]
+        self._cache = {}   # normalized prefix -> {kind: [(id, label), ...]}
+        self._top = {}     # short prefix -> {kind: [sorted rank keys, complete]}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (kind, id, label, score) rows with a single sort."""
+        index = cls()
+        for kind, pk, label, score in rows:
+            keys = _keys(kind, label)
+            index._items[(kind, pk)] = [label, score or 0, keys]
+            index._keys.extend((key, kind, pk) for key in keys)
+        index._keys.sort()
+        index._build_top()
+        return index
+
+    def _build_top(self):
+        candidates = {}
+        for (kind, pk), item in self._items.items():
+            rank = _rank_key(pk, item)
+            for prefix in _short_prefixes(item[2]):
+                candidates.setdefault(prefix, {}).setdefault(kind, []).append(rank)
+        self._top = {
+            prefix: {kind: _top_slot(ranks) for kind, ranks in by_kind.items()}
+            for prefix, by_kind in candidates.items()
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+    def has(self, kind, pk):
+        return (kind, pk) in self._items
+
+    def _changed(self, kind, pk, old, new):
+        """
+        Record that (kind, pk) went from `old` to `new` ([label, score, keys]
+        or None). Precomputed short-prefix rankings are updated in place,
+        cached longer prefixes of the affected keys are dropped.
+        """
+        old_rank = _rank_key(pk, old) if old else None
+        new_rank = _rank_key(pk, new) if new else None
+        old_prefixes = _short_prefixes(old[2]) if old else set()
+        new_prefixes = _short_prefixes(new[2]) if new else set()
+        for prefix in old_prefixes | new_prefixes:
+            slot = self._top.setdefault(prefix, {}).setdefault(kind, [[], True])
+            ranks = slot[0]
+            if prefix in old_prefixes:
+                i = bisect_left(ranks, old_rank)
+                if i < len(ranks) and ranks[i] == old_rank:
+                    del ranks[i]
+            # A truncated ranking only takes entries that beat its last one;
+            # anything else may rank below matches it no longer holds.
+            if prefix in new_prefixes and (slot[1] or (ranks and new_rank < ranks[-1])):
+                insort(ranks, new_rank)
+                if len(ranks) > TOP_KEEP:
+                    ranks.pop()
+                    slot[1] = False
+            if not slot[1] and len(ranks) < MAX_LIMIT:
+                slot[:] = _top_slot(self._matches(prefix)[kind].values())
+        for keys in (old[2] if old else (), new[2] if new else ()):
+            for key in keys:
+                for end in range(SHORT_PREFIX + 1, len(key) + 1):
+                    self._cache.pop(key[:end], None)
+
+    def upsert(self, kind, pk, label, score=None):
+        with self._lock:
+            old = self._items.get((kind, pk))
+            if old is not None:
+                if score is None:
+                    score = old[1]
+                if old[0] == label:
+                    if old[1] != score:
+                        before = list(old)
+                        old[1] = score
+                        self._changed(kind, pk, before, old)
+                    return
+                self.remove(kind, pk)
+            keys = _keys(kind, label)
+            for key in keys:
+                insort(self._keys, (key, kind, pk))
+            item = self._items[(kind, pk)] = [label, score or 0, keys]
+            self._changed(kind, pk, None, item)
+
+    def adjust_score(self, kind, pk, delta):
+        with self._lock:
+            item = self._items.get((kind, pk))
+            if item is not None:
+                before = list(item)
+                item[1] += delta
+                self._changed(kind, pk, before, item)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            item = self._items.pop((kind, pk), None)
+            if item is None:
+                return
+            for key in item[2]:
+                i = bisect_left(self._keys, (key, kind, pk))
+                if i < len(self._keys) and self._keys[i] == (key, kind, pk):
+                    del self._keys[i]
+            self._changed(kind, pk, item, None)
+
+    def _matches(self, prefix):
+        """{kind: {id: rank key}} for every key starting with `prefix`."""
+        matches = {kind: {} for kind in KINDS}
+        i = bisect_left(self._keys, (prefix,))
+        keys = self._keys
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            _, kind, pk = keys[i]
+            matches[kind][pk] = _rank_key(pk, self._items[(kind, pk)])
+            i += 1
+        return matches
+
+    def _rank(self, prefix):
+        return {
+            kind: [(pk, label) for _, label, pk in heapq.nsmallest(MAX_LIMIT, ranks.values())]
+            for kind, ranks in self._matches(prefix).items()
+        }
+
+    def lookup(self, query, kinds=KINDS, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return {kind: [] for kind in kinds}
+        with self._lock:
+            if len(prefix) <= SHORT_PREFIX:
+                top = self._top.get(prefix, {})
+                return {
+                    kind: [(pk, label) for _, label, pk in top[kind][0][:limit]] if kind in top else []
+                    for kind in kinds
+                }
+            ranked = self._cache.get(prefix)
+            if ranked is None:
+                if len(self._cache) >= MAX_CACHED_PREFIXES:
+                    self._cache.clear()
+                ranked = self._cache[prefix] = self._rank(prefix)
+        return {kind: ranked[kind][:limit] for kind in kinds}
+
+
+def _rows():
+    for pk, name, uses in Tag.objects.annotate(uses=Count("stories")).values_list("id", "name", "uses"):
+        yield "tag", pk, name, uses
+    for pk, title, followers in Story.objects.values_list("id", "title", "follower_count").iterator():
+        yield "story", pk, title, followers
+    authors = (
+        User.objects.filter(stories__isnull=False)
+        .annotate(followers=Sum("stories__follower_count"))
+        .values_list("id", "username", "followers")
+    )
+    for pk, username, followers in authors:
+        yield "author", pk, username, followers
+
+
+def build_index():
+    return PrefixIndex.from_rows(_rows())
+
+
+_index = None
+_built_at = 0.0
+_build_lock = threading.Lock()   # guards _index swaps and _journal
+_rebuilding = False
+_journal = []                    # changes made while a background rebuild runs
+
+
+def _rebuild():
+    global _index, _built_at, _rebuilding
+    try:
+        fresh = build_index()
+        with _build_lock:
+            # Replay what the signal handlers applied to the old index while
+            # we were reading the database, then swap in one assignment.
+            # upsert/remove replay idempotently; an adjust_score that the
+            # build already saw is counted twice until the next rebuild.
+            for method, args in _journal:
+                getattr(fresh, method)(*args)
+            _journal.clear()
+            _index = fresh
+            _built_at = time.monotonic()
+    finally:
+        with _build_lock:
+            _rebuilding = False
+            _journal.clear()
+        close_old_connections()
+
+
+def get_index():
+    """
+    The worker's index. The first call builds it inline; after that a stale
+    index keeps serving while a background thread builds its replacement.
+    """
+    global _index, _built_at, _rebuilding
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                _index = build_index()
+                _built_at = time.monotonic()
+    elif time.monotonic() - _built_at > REBUILD_SECONDS and not _rebuilding:
+        with _build_lock:
+            if _rebuilding:
+                return _index
+            _rebuilding = True
+        threading.Thread(target=_rebuild, name="autocomplete-rebuild", daemon=True).start()
+    return _index
+
+
+def loaded_index():
+    """The index if this worker has built it already, else None."""
+    return _index
+
+
+def apply_change(method, *args):
+    """
+    Apply an incremental update (upsert / remove / adjust_score) to the loaded
+    index, and record it for replay if a background rebuild is in flight.
+    No-op until the index has been built.
+    """
+    with _build_lock:
+        if _index is None:
+            return
+        getattr(_index, method)(*args)
+        if _rebuilding:
+            _journal.append((method, args))
+
+
+def reset_index():
+    global _index
+    _index = None
@@ -0,0 +1,155 @@
+# core/covers.py
+"""
+Story cover images.
+
+Uploads are streamed to a temporary file (never held in memory), hashed in
+chunks and stored once under their SHA-256, so the same picture uploaded for
+several stories is a single CoverImage. Resized WebP/JPEG variants are made
+with Pillow on a background thread after the upload's transaction commits;
+`manage.py process_cover_images` picks up anything left pending (e.g. after a
+worker restart).
+
+All stored names contain the content hash, so they never change and can be
+served with `Cache-Control: immutable`. In production that header is set
+where MEDIA_URL is served (web server or CDN); with DEBUG on, the dev-only
+`cover_file` view sends it.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import CoverImage
+
+logger = logging.getLogger(__name__)
+
+# name -> max width in pixels; height follows the aspect ratio
+VARIANT_WIDTHS = getattr(settings, "COVER_VARIANT_WIDTHS", {"thumb": 160, "card": 400, "large": 1000})
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+ALLOWED_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+MAX_UPLOAD_BYTES = getattr(settings, "COVER_MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cover-variants")
+
+
+class InvalidCover(ValueError):
+    pass
+
+
+def _sha256(uploaded):
+    digest = hashlib.sha256()
+    for chunk in uploaded.chunks():
+        digest.update(chunk)
+    uploaded.seek(0)
+    return digest.hexdigest()
+
+
+def store_upload(uploaded):
+    """
+    Validate an UploadedFile, store it once per content hash and return the
+    CoverImage (existing or new). New images get their variants queued.
+    Raises InvalidCover.
+    """
+    if uploaded.size > MAX_UPLOAD_BYTES:
+        raise InvalidCover(f"Image is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    try:
+        with Image.open(uploaded) as img:
+            fmt = img.format
+            width, height = img.size
+            img.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidCover("Not a valid image.")
+    if fmt not in ALLOWED_FORMATS:
+        raise InvalidCover(f"Unsupported format {fmt}; use JPEG, PNG, WebP or GIF.")
+    uploaded.seek(0)
+
+    sha = _sha256(uploaded)
+    existing = CoverImage.objects.filter(sha256=sha).first()
+    if existing:
+        if existing.status == CoverImage.FAILED:
+            # Uploading the same image again retries its variants.
+            failed = CoverImage.objects.filter(pk=existing.pk, status=CoverImage.FAILED)
+            if failed.update(status=CoverImage.PENDING):
+                existing.status = CoverImage.PENDING
+                transaction.on_commit(lambda: queue_variants(existing.pk))
+        return existing
+
+    # Storage.save() copies from the temp file chunk by chunk.
+    name = default_storage.save(f"covers/{sha[:2]}/{sha}/original.{ALLOWED_FORMATS[fmt]}", uploaded)
+    cover, created = CoverImage.objects.get_or_create(
+        sha256=sha,
+        defaults={"original": name, "width": width, "height": height, "size": uploaded.size},
+    )
+    if created:
+        transaction.on_commit(lambda: queue_variants(cover.pk))
+    elif cover.original.name != name:
+        default_storage.delete(name)  # lost a race with an identical upload
+    return cover
+
+
+def queue_variants(cover_id):
+    _executor.submit(_generate_in_thread, cover_id)
+
+
+def _generate_in_thread(cover_id):
+    try:
+        generate_variants(CoverImage.objects.get(pk=cover_id))
+    except Exception:
+        logger.exception("Cover variant generation failed for %s", cover_id)
+    finally:
+        close_old_connections()
+
+
+def generate_variants(cover):
+    """Render every size/format variant of `cover` and mark it ready (or failed)."""
+    try:
+        with default_storage.open(cover.original.name, "rb") as fh:
+            img = Image.open(fh)
+            img.load()
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        variants = {}
+        base = cover.original.name.rsplit("/", 1)[0]
+        for label, max_width in VARIANT_WIDTHS.items():
+            resized = img.copy()
+            resized.thumbnail((max_width, resized.height), Image.LANCZOS)  # width-bound; never upscales
+            variants[label] = {}
+            for ext, (fmt, opts) in VARIANT_FORMATS.items():
+                buf = io.BytesIO()
+                resized.save(buf, fmt, **opts)
+                name = f"{base}/{label}.{ext}"
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                variants[label][ext] = default_storage.save(name, ContentFile(buf.getvalue()))
+    except (OSError, Image.DecompressionBombError):
+        logger.exception("Could not render variants for cover %s", cover.pk)
+        cover.status = CoverImage.FAILED
+        cover.save(update_fields=["status"])
+        return cover
+    cover.variants = variants
+    cover.status = CoverImage.READY
+    cover.save(update_fields=["variants", "status"])
+    return cover
+
+
+def cover_urls(cover):
+    if cover is None:
+        return None
+    return {
+        "status": cover.status,
+        "width": cover.width,
+        "height": cover.height,
+        "original": default_storage.url(cover.original.name),
+        "variants": {
+            label: {ext: default_storage.url(name) for ext, name in formats.items()}
+            for label, formats in (cover.variants or {}).items()
+        },
+    }
@@ -0,0 +1,99 @@
+# core/db_router.py
+"""
+Read-replica routing.
+
+Replicas are the DATABASES aliases listed in settings.DATABASE_REPLICAS. Nothing
+goes to a replica unless a view opts in for the current request (see
+ReplicaRoutingMixin in core/views.py); everything else, including all writes,
+uses "default".
+
+- Read-your-writes: after a user writes, pin_user_to_primary() keeps that user
+  on the primary for REPLICA_PIN_SECONDS. The pin lives in the Django cache, so
+  with several workers the cache must be shared (e.g. Redis/Memcached).
+- Health: each replica is probed with SELECT 1 at most every
+  REPLICA_HEALTH_CHECK_INTERVAL seconds per process; failing replicas are
+  skipped and reads fall back to the primary if none is healthy.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+_read_alias = ContextVar("read_alias", default=None)
+
+# alias -> (healthy, checked_at); per process
+_health = {}
+
+
+def replica_aliases():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def _pin_key(user_id):
+    return f"db-pin-primary:{user_id}"
+
+
+def pin_user_to_primary(user):
+    if user and user.is_authenticated and replica_aliases():
+        cache.set(_pin_key(user.pk), 1, timeout=getattr(settings, "REPLICA_PIN_SECONDS", 5))
+
+
+def is_pinned_to_primary(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+def _probe(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except DatabaseError:
+        connections[alias].close()
+        return False
+
+
+def is_healthy(alias):
+    interval = getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 10)
+    now = time.monotonic()
+    healthy, checked_at = _health.get(alias, (True, None))
+    if checked_at is None or now - checked_at >= interval:
+        healthy = _probe(alias)
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def mark_unhealthy(alias):
+    _health[alias] = (False, time.monotonic())
+
+
+def choose_replica():
+    """A random healthy replica alias, or None to stay on the primary."""
+    healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+def use_read_alias(alias):
+    """Route reads for the current context to `alias`; returns a reset token."""
+    return _read_alias.set(alias)
+
+
+def reset_read_alias(token):
+    _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replicas hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,133 @@
+# core/feed.py
+"""
+"My follows" feed of new chapters.
+
+Hybrid fan-out:
+- Stories with up to FEED_FANOUT_MAX_FOLLOWERS followers push a FeedEntry to
+  every follower when a chapter is published, with batched INSERTs.
+- Bigger stories skip the push (a release would otherwise write one row per
+  follower inside the publishing request) and their chapters are pulled at
+  read time instead.
+
+A feed page is a single SQL statement: the UNION of a range scan on
+FeedEntry(user, published_at) and a scan of Chapter(story, created_at) over the
+user's followed big stories, ordered by (published_at, chapter id) desc.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+
+from .autocomplete import apply_change
+from .models import Chapter, FeedEntry, Story, StoryFollow
+
+FANOUT_MAX_FOLLOWERS = getattr(settings, "FEED_FANOUT_MAX_FOLLOWERS", 10_000)
+FANOUT_BATCH_SIZE = getattr(settings, "FEED_FANOUT_BATCH_SIZE", 1_000)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def follow_story(user, story):
+    """Returns True if a new follow was created."""
+    try:
+        with transaction.atomic():
+            StoryFollow.objects.create(user=user, story=story)
+            Story.objects.filter(pk=story.pk).update(follower_count=F("follower_count") + 1)
+            transaction.on_commit(lambda: _reindex_popularity(story, 1))
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow_story(user, story):
+    """Returns True if a follow was removed. Already-delivered entries stay in the feed."""
+    with transaction.atomic():
+        deleted, _ = StoryFollow.objects.filter(user=user, story=story).delete()
+        if deleted:
+            Story.objects.filter(pk=story.pk, follower_count__gt=0).update(
+                follower_count=F("follower_count") - 1
+            )
+            transaction.on_commit(lambda: _reindex_popularity(story, -1))
+    return bool(deleted)
+
+
+def _reindex_popularity(story, delta):
+    # follower_count changes via update(), which sends no signals.
+    apply_change("adjust_score", "story", story.pk, delta)
+    apply_change("adjust_score", "author", story.author_id, delta)
+
+
+def is_fanned_out_on_read(story):
+    return story.follower_count > FANOUT_MAX_FOLLOWERS
+
+
+def fan_out_chapter(chapter):
+    """Push `chapter` into its followers' feeds. Returns the number of rows written."""
+    story = chapter.story
+    if is_fanned_out_on_read(story):
+        return 0
+    follower_ids = (
+        StoryFollow.objects.filter(story_id=story.pk)
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    written = 0
+    batch = []
+    for user_id in follower_ids:
+        batch.append(FeedEntry(user_id=user_id, chapter_id=chapter.pk, published_at=chapter.created_at))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def encode_cursor(published_at, chapter_id):
+    micros = (published_at - EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{chapter_id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on garbage."""
+    micros, _, chapter_id = cursor.partition("_")
+    try:
+        return EPOCH + timedelta(microseconds=int(micros)), int(chapter_id)
+    except OverflowError:
+        raise ValueError(f"Cursor out of range: {cursor!r}")
+
+
+def feed_page(user, limit, before=None):
+    """
+    Up to `limit` (chapter_id, published_at) pairs, newest first, strictly
+    older than the `before` cursor tuple. Duplicates across the two sources
+    collapse in the UNION.
+    """
+    pushed = FeedEntry.objects.filter(user=user)
+    pulled = Chapter.objects.filter(
+        story__follows__user=user,
+        story__follows__created_at__lte=F("created_at"),
+        story__follower_count__gt=FANOUT_MAX_FOLLOWERS,
+    )
+    if before:
+        published_at, chapter_id = before
+        pushed = pushed.filter(
+            Q(published_at__lt=published_at) | Q(published_at=published_at, chapter_id__lt=chapter_id)
+        )
+        pulled = pulled.filter(
+            Q(created_at__lt=published_at) | Q(created_at=published_at, id__lt=chapter_id)
+        )
+    pushed = pushed.values_list("chapter_id", "published_at")
+    pulled = pulled.values_list("id", "created_at")
+    if connections[pushed.db].features.supports_slicing_ordering_in_compound:
+        # Let each arm stop after `limit` rows of its index instead of
+        # materialising the user's whole feed before the outer sort.
+        pushed = pushed.order_by("-published_at", "-chapter_id")[:limit]
+        pulled = pulled.order_by("-created_at", "-id")[:limit]
+    else:
+        pushed = pushed.order_by()
+        pulled = pulled.order_by()
+    return list(pushed.union(pulled).order_by("-published_at", "-chapter_id")[:limit])
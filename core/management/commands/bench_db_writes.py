@@ -0,0 +1,75 @@
+# core/management/commands/bench_db_writes.py
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from royalroad_clone.db_tuning import sqlite_pragmas
+
+PROFILES = {
+    # What Django did before db_tuning: rollback journal, synchronous=FULL,
+    # deferred transactions and the sqlite3 module's 5 s timeout.
+    "default": {"pragmas": [], "begin": "BEGIN"},
+    "tuned": {"pragmas": sqlite_pragmas(), "begin": "BEGIN IMMEDIATE"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite write throughput under concurrency with the default "
+        "settings vs the db_tuning profile, on a throwaway database file. "
+        "Each transaction reads then writes, like a typical request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0)
+
+    def handle(self, *args, workers, seconds, **options):
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                commits, errors = self._run(os.path.join(tmp, "bench.sqlite3"), profile, workers, seconds)
+            self.stdout.write(
+                f"{name:>8}: {commits / seconds:8.1f} commits/s, {errors} 'database is locked' errors "
+                f"({workers} workers, {seconds:g}s)"
+            )
+
+    def _connect(self, path, profile):
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for pragma in profile["pragmas"]:
+            conn.execute(pragma)
+        return conn
+
+    def _run(self, path, profile, workers, seconds):
+        conn = self._connect(path, profile)
+        conn.execute("CREATE TABLE chapter (id INTEGER PRIMARY KEY, story_id INT, content TEXT)")
+        conn.close()
+
+        counts = [[0, 0] for _ in range(workers)]
+        deadline = time.monotonic() + seconds
+
+        def work(slot):
+            conn = self._connect(path, profile)
+            payload = "x" * 2000
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(profile["begin"])
+                    conn.execute("SELECT COUNT(*) FROM chapter WHERE story_id = ?", (slot,)).fetchone()
+                    conn.execute("INSERT INTO chapter (story_id, content) VALUES (?, ?)", (slot, payload))
+                    conn.execute("COMMIT")
+                    counts[slot][0] += 1
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    counts[slot][1] += 1
+            conn.close()
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(c for c, _ in counts), sum(e for _, e in counts)
@@ -0,0 +1,59 @@
+# core/management/commands/compact_chapter_revisions.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import Chapter, ChapterRevision
+from core.revisions import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Thin out old chapter revisions. The newest --keep revisions and anything "
+        "younger than --days are kept as-is; older ones are reduced to the last "
+        "revision of each day, with the deltas in between merged together."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep", type=int, default=20, help="Always keep this many latest revisions per chapter.")
+        parser.add_argument("--days", type=int, default=30, help="Always keep revisions younger than this.")
+        parser.add_argument("--chapter", type=int, help="Only compact this chapter id.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, keep, days, chapter=None, dry_run=False, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+        chapters = (
+            ChapterRevision.objects.filter(created_at__lt=cutoff)
+            .order_by()
+            .values("chapter_id")
+            .annotate(n=Count("id"))
+            .filter(n__gt=1)
+            .values_list("chapter_id", flat=True)
+        )
+        if chapter:
+            chapters = chapters.filter(chapter_id=chapter)
+
+        total = 0
+        for chapter_id in chapters.iterator():
+            rows = list(
+                ChapterRevision.objects.filter(chapter_id=chapter_id)
+                .order_by("-number")
+                .values_list("number", "created_at")
+            )
+            keep_numbers = set()
+            seen_days = set()
+            for i, (number, created_at) in enumerate(rows):
+                day = timezone.localdate(created_at)
+                if i < keep or created_at >= cutoff or day not in seen_days:
+                    keep_numbers.add(number)
+                seen_days.add(day)
+
+            dropped = len(rows) - len(keep_numbers)
+            if dropped and not dry_run:
+                compact(Chapter.objects.get(pk=chapter_id), keep_numbers)
+            total += dropped
+
+        verb = "Would drop" if dry_run else "Dropped"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} revision(s)."))
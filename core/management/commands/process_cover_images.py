@@ -0,0 +1,26 @@
+# core/management/commands/process_cover_images.py
+from django.core.management.base import BaseCommand
+
+from core.covers import generate_variants
+from core.models import CoverImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for cover images still pending (or all with --all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate every cover, e.g. after changing sizes.")
+        parser.add_argument("--retry-failed", action="store_true")
+
+    def handle(self, *args, all=False, retry_failed=False, **options):
+        qs = CoverImage.objects.all()
+        if not all:
+            statuses = [CoverImage.PENDING] + ([CoverImage.FAILED] if retry_failed else [])
+            qs = qs.filter(status__in=statuses)
+        done = failed = 0
+        for cover in qs.iterator():
+            if generate_variants(cover).status == CoverImage.READY:
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} cover(s), {failed} failed."))
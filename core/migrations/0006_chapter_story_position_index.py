@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_chapterrevision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['story', 'position'], name='core_chapte_story_i_7076c6_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_chapter_story_position_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['chapter', '-created_at'], name='core_commen_chapter_83f5ae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at'], name='core_commen_created_97080c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['created_at'], name='core_rating_created_54a801_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['value', 'created_at'], name='core_rating_value_23f8ef_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_story_cover_images'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chapter',
+            options={'ordering': ['position', 'id']},
+        ),
+    ]
@@ -1,6 +1,8 @@
 # core/models.py
+from contextvars import ContextVar
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, When
 from django.contrib.auth.models import User
 
 class Tag(models.Model):
@@ -10,6 +12,27 @@ class Tag(models.Model):
         return self.name
 
 
+class CoverImage(models.Model):
+    """
+    An uploaded cover, stored once per content hash and shared by every story
+    that uses it. `variants` maps size -> format -> storage name (see core/covers.py).
+    """
+    PENDING, READY, FAILED = 'PENDING', 'READY', 'FAILED'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (READY, 'Ready'), (FAILED, 'Failed')]
+
+    sha256     = models.CharField(max_length=64, unique=True)
+    original   = models.FileField(max_length=255)
+    width      = models.PositiveIntegerField()
+    height     = models.PositiveIntegerField()
+    size       = models.PositiveIntegerField()
+    status     = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    variants   = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256[:12]
+
+
 class Story(models.Model):
     STATUS_CHOICES = [
         ('ONGOING',   'Ongoing'),
@@ -21,6 +44,8 @@ class Story(models.Model):
     summary    = models.TextField()
     status     = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ONGOING')
     tags       = models.ManyToManyField(Tag, through='StoryTag', related_name='stories')
+    follower_count = models.PositiveIntegerField(default=0)
+    cover      = models.ForeignKey(CoverImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='stories')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -45,21 +70,119 @@ class Chapter(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['position']
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['story', 'position']),
+            models.Index(fields=['story', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.story.title} - {self.title}"
 
 
+# Comment.path: one fixed-width base36 segment per ancestor id, root first, so
+# lexical order is thread order and a subtree is a contiguous path range.
+COMMENT_PATH_STEP = 7
+
+
+def encode_path_segment(pk):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while pk:
+        pk, rem = divmod(pk, 36)
+        out = digits[rem] + out
+    return out.rjust(COMMENT_PATH_STEP, "0")
+
+
+def decode_path(path):
+    return [int(path[i:i + COMMENT_PATH_STEP], 36) for i in range(0, len(path), COMMENT_PATH_STEP)]
+
+
+# True while Comment.delete() removes a subtree and fixes the counters itself;
+# other deletes (cascades, bulk deletes) are counted by core/signals.py.
+in_subtree_delete = ContextVar("comment_subtree_delete", default=False)
+
+
 class Comment(models.Model):
+    MAX_DEPTH = 32  # path max_length / COMMENT_PATH_STEP, with headroom
+
     user       = models.ForeignKey(User, on_delete=models.CASCADE)
     chapter    = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='comments')
+    parent     = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     content    = models.TextField()
+    path       = models.CharField(max_length=255, blank=True, default='', editable=False)
+    depth      = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count      = models.PositiveIntegerField(default=0, editable=False)  # direct replies
+    descendant_count = models.PositiveIntegerField(default=0, editable=False)  # whole subtree
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['chapter', '-created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['chapter', 'path']),
+            models.Index(
+                fields=['chapter', '-created_at'],
+                condition=Q(parent__isnull=True),
+                name='core_comment_top_level_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.chapter.title}"
 
+    def ancestor_ids(self):
+        return decode_path(self.path)[:-1]
+
+    def subtree(self):
+        """This comment and all its replies, as one range scan on (chapter, path)."""
+        upper = self.path[:-COMMENT_PATH_STEP] + encode_path_segment(decode_path(self.path)[-1] + 1)
+        return Comment.objects.filter(chapter_id=self.chapter_id, path__gte=self.path, path__lt=upper)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = parent_path + encode_path_segment(self.pk)
+            self.depth = len(parent_path) // COMMENT_PATH_STEP
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            if self.parent_id:
+                Comment.objects.filter(pk__in=decode_path(parent_path)).update(
+                    descendant_count=F('descendant_count') + 1,
+                    reply_count=Case(
+                        When(pk=self.parent_id, then=F('reply_count') + 1),
+                        default=F('reply_count'),
+                        output_field=models.PositiveIntegerField(),
+                    ),
+                )
+
+    def uncount(self, removed=1):
+        """Take `removed` comments (this one and its replies) off the ancestors' counters."""
+        ancestors = self.ancestor_ids()
+        if ancestors:
+            Comment.objects.filter(pk__in=ancestors).update(
+                descendant_count=F('descendant_count') - removed,
+                reply_count=Case(
+                    When(pk=self.parent_id, then=F('reply_count') - 1),
+                    default=F('reply_count'),
+                    output_field=models.PositiveIntegerField(),
+                ),
+            )
+
+    def delete(self, *args, **kwargs):
+        """Delete the whole subtree in one statement and fix the ancestors' counters."""
+        with transaction.atomic():
+            removed = self.descendant_count + 1
+            token = in_subtree_delete.set(True)
+            try:
+                result = self.subtree().delete()
+            finally:
+                in_subtree_delete.reset(token)
+            self.uncount(removed)
+        return result
+
 
 class Rating(models.Model):
     user       = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -69,6 +192,64 @@ class Rating(models.Model):
 
     class Meta:
         unique_together = ('user','chapter')
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['value', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Rating {self.value} by {self.user.username} on {self.chapter.title}"
+
+
+class ChapterRevision(models.Model):
+    """
+    One saved version of a chapter. Snapshots keep the full text in `content`;
+    the others keep a line delta against the previous revision in `delta`
+    (see core/revisions.py).
+    """
+    chapter     = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='revisions')
+    number      = models.PositiveIntegerField()
+    title       = models.CharField(max_length=255)
+    is_snapshot = models.BooleanField(default=False)
+    content     = models.TextField(blank=True)
+    delta       = models.JSONField(null=True, blank=True)
+    size        = models.PositiveIntegerField(default=0)
+    editor      = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at  = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-number']
+        unique_together = ('chapter', 'number')
+
+    def __str__(self):
+        return f"{self.chapter_id} r{self.number}"
+
+
+class StoryFollow(models.Model):
+    user       = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follows')
+    story      = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='follows')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'story')
+
+    def __str__(self):
+        return f"{self.user_id} follows {self.story_id}"
+
+
+class FeedEntry(models.Model):
+    """
+    A new chapter pushed into a follower's feed (fan-out on write, see core/feed.py).
+    published_at mirrors chapter.created_at so the feed is one range scan on
+    (user, published_at).
+    """
+    user         = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    chapter      = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='feed_entries')
+    published_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'chapter')
+        indexes = [models.Index(fields=['user', '-published_at', '-chapter'])]
+
+    def __str__(self):
+        return f"{self.chapter_id} for {self.user_id}"
@@ -0,0 +1,108 @@
+# core/ordering.py
+"""
+Sparse chapter ordering.
+
+Chapter.position is a sort key, not a dense index: new chapters are appended
+POSITION_GAP after the last one, so a chapter can be inserted or moved between
+two neighbours by giving it a key in the gap and updating that one row. Only
+when a gap is exhausted do we rebalance the whole story back to multiples of
+POSITION_GAP. Either way a reorder is one SELECT ... FOR UPDATE plus a single
+UPDATE ... CASE, independent of the number of chapters.
+"""
+from django.db import transaction
+from django.db.models import Case, Max, Value, When
+
+from .models import Chapter
+
+POSITION_GAP = 1024
+MAX_POSITION = 2**31 - 1  # PositiveIntegerField is a 32-bit integer on Postgres
+
+
+def _apply(positions):
+    """Write {chapter_id: position} in one UPDATE statement."""
+    if not positions:
+        return 0
+    return Chapter.objects.filter(pk__in=positions).update(
+        position=Case(*[When(pk=pk, then=Value(pos)) for pk, pos in positions.items()])
+    )
+
+
+def _plan(rows, ids, after):
+    """
+    rows:  [(id, position), ...] of the whole story in current order.
+    ids:   chapter ids to place, in their new relative order.
+    after: id of the chapter they should follow, or None for the start.
+    Returns {id: new_position} for the rows whose key must change.
+    """
+    moving = set(ids)
+    remaining = [row for row in rows if row[0] not in moving]
+    if after is None:
+        idx = 0
+    else:
+        idx = next(i for i, row in enumerate(remaining) if row[0] == after) + 1
+
+    k = len(ids)
+    lo = remaining[idx - 1][1] if idx > 0 else 0
+    hi = remaining[idx][1] if idx < len(remaining) else lo + POSITION_GAP * (k + 1)
+    if hi - lo > k and hi <= MAX_POSITION:
+        step = (hi - lo) // (k + 1)
+        planned = {pk: lo + step * (i + 1) for i, pk in enumerate(ids)}
+    else:
+        order = [row[0] for row in remaining[:idx]] + list(ids) + [row[0] for row in remaining[idx:]]
+        planned = {pk: (i + 1) * POSITION_GAP for i, pk in enumerate(order)}
+
+    current = dict(rows)
+    return {pk: pos for pk, pos in planned.items() if current.get(pk) != pos}
+
+
+def move_chapters(story_id, ids, after=None):
+    """
+    Place `ids` (in that order) right after chapter `after` (or first when None).
+    Passing every chapter id with after=None sets a full new ordering.
+    Raises ValueError on unknown or duplicate ids. Returns the number of rows updated.
+    """
+    ids = list(ids)
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate chapter ids.")
+    with transaction.atomic():
+        rows = list(
+            Chapter.objects.select_for_update()
+            .filter(story_id=story_id)
+            .order_by("position", "id")
+            .values_list("id", "position")
+        )
+        known = {row[0] for row in rows}
+        unknown = [pk for pk in ids if pk not in known]
+        if unknown:
+            raise ValueError(f"Chapters not in this story: {unknown}.")
+        if after is not None and (after not in known or after in ids):
+            raise ValueError("`after` must be another chapter of this story.")
+        return _apply(_plan(rows, ids, after))
+
+
+def position_for_new_chapter(story_id, after=None):
+    """
+    Sort key for a chapter about to be created in `story_id`: at the end, or
+    directly after chapter `after` (rebalancing the story if there's no room).
+    """
+    if after is None:
+        last = Chapter.objects.filter(story_id=story_id).aggregate(m=Max("position"))["m"] or 0
+        if last + POSITION_GAP <= MAX_POSITION:
+            return last + POSITION_GAP
+    with transaction.atomic():
+        rows = list(
+            Chapter.objects.select_for_update()
+            .filter(story_id=story_id)
+            .order_by("position", "id")
+            .values_list("id", "position")
+        )
+        if after is not None and after not in {row[0] for row in rows}:
+            raise ValueError("`after` must be a chapter of this story.")
+        if after is None and rows:
+            after = rows[-1][0]
+        # Plan the insert as a move of a placeholder id, then persist any
+        # rebalance the plan needed for the existing rows.
+        planned = _plan(rows, [None], after)
+        new_position = planned.pop(None)
+        _apply(planned)
+        return new_position
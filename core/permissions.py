@@ -38,3 +38,17 @@ class IsStoryOwnerFromURLOrReadOnly(BasePermission):
         story = getattr(obj, "story", None)
         author_id = getattr(getattr(story, "author", None), "id", None)
         return author_id == getattr(request.user, "id", None)
+
+
+class IsStoryOwnerFromURL(IsStoryOwnerFromURLOrReadOnly):
+    """
+    Same checks as IsStoryOwnerFromURLOrReadOnly, but reads are owner-only too.
+    Used for author-private data such as chapter revision history.
+    """
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        return Story.objects.filter(pk=view.kwargs.get("story_pk"), author_id=request.user.id).exists()
+
+    def has_object_permission(self, request, view, obj):
+        return obj.story.author_id == getattr(request.user, "id", None)
@@ -0,0 +1,213 @@
+# core/revisions.py
+"""
+Chapter revision history with delta-compressed storage.
+
+Every save of a chapter appends a ChapterRevision. Most revisions only store a
+line-level delta against the revision right before them; every
+CHAPTER_REVISION_SNAPSHOT_INTERVAL revisions (or whenever a delta would be
+bigger than the text itself) a full snapshot is stored instead. Rebuilding any
+revision therefore means: load the nearest snapshot at or before it, then apply
+fewer than SNAPSHOT_INTERVAL deltas.
+
+Delta format (JSON list of ops, applied to the base text split into lines):
+  [0, n]        copy the next n lines from the base
+  [1, [lines]]  insert these lines
+  [2, n]        skip the next n lines of the base
+"""
+import difflib
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Chapter, ChapterRevision
+
+COPY, INSERT, SKIP = 0, 1, 2
+
+SNAPSHOT_INTERVAL = getattr(settings, "CHAPTER_REVISION_SNAPSHOT_INTERVAL", 10)
+
+
+def _lines(text):
+    return (text or "").splitlines(keepends=True)
+
+
+def make_delta(base, target):
+    """Return the op list that turns `base` into `target`."""
+    a, b = _lines(base), _lines(target)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([COPY, i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append([SKIP, i2 - i1])
+        if j2 > j1:
+            ops.append([INSERT, b[j1:j2]])
+    return ops
+
+
+def apply_delta(base, ops):
+    a = _lines(base)
+    out = []
+    i = 0
+    for op, arg in ops:
+        if op == COPY:
+            out.extend(a[i:i + arg])
+            i += arg
+        elif op == SKIP:
+            i += arg
+        else:
+            out.extend(arg)
+    return "".join(out)
+
+
+def _delta_size(ops):
+    return len(json.dumps(ops, separators=(",", ":")))
+
+
+def reconstruct(revision):
+    """Full content of `revision` (snapshot + at most SNAPSHOT_INTERVAL - 1 deltas)."""
+    if revision.is_snapshot:
+        return revision.content
+    snapshot = (
+        ChapterRevision.objects.filter(
+            chapter_id=revision.chapter_id, number__lt=revision.number, is_snapshot=True
+        )
+        .order_by("-number")
+        .first()
+    )
+    chain = ChapterRevision.objects.filter(
+        chapter_id=revision.chapter_id,
+        number__gt=snapshot.number,
+        number__lte=revision.number,
+    ).order_by("number")
+    text = snapshot.content
+    for rev in chain:
+        text = rev.content if rev.is_snapshot else apply_delta(text, rev.delta)
+    return text
+
+
+def _encode(previous, previous_text, content):
+    """Pick snapshot vs delta for a revision following `previous`."""
+    if previous is None:
+        return True, content, None
+    chain_length = ChapterRevision.objects.filter(
+        chapter_id=previous.chapter_id,
+        number__gt=_last_snapshot_number(previous),
+        number__lte=previous.number,
+    ).count()
+    if chain_length + 1 >= SNAPSHOT_INTERVAL:
+        return True, content, None
+    ops = make_delta(previous_text, content)
+    if _delta_size(ops) >= len(content):
+        return True, content, None
+    return False, "", ops
+
+
+def _last_snapshot_number(revision):
+    if revision.is_snapshot:
+        return revision.number
+    return (
+        ChapterRevision.objects.filter(
+            chapter_id=revision.chapter_id, number__lt=revision.number, is_snapshot=True
+        )
+        .order_by("-number")
+        .values_list("number", flat=True)
+        .first()
+    )
+
+
+def record_revision(chapter, editor=None):
+    """
+    Append a revision for the chapter's current title/content.
+    Returns the new revision, or None when nothing changed since the last one.
+    """
+    with transaction.atomic():
+        # Serialise concurrent saves of the same chapter so numbers stay dense.
+        Chapter.objects.select_for_update().filter(pk=chapter.pk).exists()
+        previous = chapter.revisions.order_by("-number").first()
+        previous_text = reconstruct(previous) if previous else None
+        if previous and previous_text == chapter.content and previous.title == chapter.title:
+            return None
+
+        is_snapshot, content, delta = _encode(previous, previous_text, chapter.content)
+        return ChapterRevision.objects.create(
+            chapter=chapter,
+            number=previous.number + 1 if previous else 1,
+            title=chapter.title,
+            is_snapshot=is_snapshot,
+            content=content,
+            delta=delta,
+            size=len(chapter.content),
+            editor=editor if editor and editor.is_authenticated else None,
+        )
+
+
+NO_NEWLINE = "\\ No newline at end of file\n"
+
+
+def _diff_lines(text):
+    lines = _lines(text)
+    if lines and not lines[-1].endswith("\n"):
+        # As in `diff -u`: terminate the line and flag the missing newline.
+        lines[-1] += "\n" + NO_NEWLINE
+    return lines
+
+
+def unified_diff(old_revision, old_text, new_revision, new_text):
+    return "".join(
+        difflib.unified_diff(
+            _diff_lines(old_text),
+            _diff_lines(new_text),
+            fromfile=f"r{old_revision.number}" if old_revision else "empty",
+            tofile=f"r{new_revision.number}",
+        )
+    )
+
+
+def compact(chapter, keep_numbers):
+    """
+    Drop every revision of `chapter` whose number is not in `keep_numbers` and
+    re-encode the survivors, so the deltas of dropped revisions are merged into
+    the delta of the next kept one. Revision numbers are left untouched.
+    Returns the number of deleted revisions.
+    """
+    with transaction.atomic():
+        Chapter.objects.select_for_update().filter(pk=chapter.pk).exists()
+        revisions = list(chapter.revisions.order_by("number"))
+        keep_numbers = set(keep_numbers)
+        if all(rev.number in keep_numbers for rev in revisions):
+            return 0
+
+        # Walk the whole history once, materialising only the kept texts.
+        kept = []
+        text = ""
+        for rev in revisions:
+            text = rev.content if rev.is_snapshot else apply_delta(text, rev.delta)
+            if rev.number in keep_numbers:
+                kept.append((rev, text))
+
+        dropped = [rev.pk for rev in revisions if rev.number not in keep_numbers]
+        ChapterRevision.objects.filter(pk__in=dropped).delete()
+
+        previous_text = None
+        since_snapshot = 0
+        for rev, text in kept:
+            if previous_text is None or since_snapshot + 1 >= SNAPSHOT_INTERVAL:
+                ops = None
+            else:
+                ops = make_delta(previous_text, text)
+                if _delta_size(ops) >= len(text):
+                    ops = None
+            if ops is None:
+                rev.is_snapshot, rev.content, rev.delta = True, text, None
+                since_snapshot = 0
+            else:
+                rev.is_snapshot, rev.content, rev.delta = False, "", ops
+                since_snapshot += 1
+            previous_text = text
+        ChapterRevision.objects.bulk_update(
+            [rev for rev, _ in kept], ["is_snapshot", "content", "delta"]
+        )
+        return len(dropped)
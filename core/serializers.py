@@ -3,7 +3,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.db.models import Avg
 from rest_framework import serializers
-from .models import Tag, Story, Chapter, Comment, Rating
+from .covers import cover_urls
+from .models import Tag, Story, Chapter, ChapterRevision, Comment, Rating
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -25,6 +26,7 @@ class StorySerializer(serializers.ModelSerializer):
         many=True, write_only=True, required=False, queryset=Tag.objects.all()
     )
     average_rating = serializers.FloatField(read_only=True)
+    cover = serializers.SerializerMethodField()
 
     class Meta:
         model = Story
@@ -37,10 +39,16 @@ class StorySerializer(serializers.ModelSerializer):
             "tags",
             "tag_ids",
             "average_rating",
+            "follower_count",
+            "cover",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["author", "average_rating", "created_at", "updated_at"]
+        read_only_fields = ["author", "average_rating", "follower_count", "created_at", "updated_at"]
+
+    def get_cover(self, obj):
+        # {"status", "width", "height", "original", "variants": {size: {"webp": url, "jpeg": url}}}
+        return cover_urls(obj.cover)
 
     def create(self, validated_data):
         tag_ids = validated_data.pop("tag_ids", [])
@@ -60,10 +68,38 @@ class StorySerializer(serializers.ModelSerializer):
 
 
 class ChapterSerializer(serializers.ModelSerializer):
+    # Optional on create: insert directly after this chapter instead of at the end.
+    after = serializers.IntegerField(write_only=True, required=False, allow_null=True)
+
     class Meta:
         model = Chapter
-        fields = ["id", "title", "content", "position", "story", "created_at", "updated_at"]
+        fields = ["id", "title", "content", "position", "after", "story", "created_at", "updated_at"]
         read_only_fields = ["story", "created_at", "updated_at"]
+        extra_kwargs = {"position": {"required": False}}
+
+
+class ChapterReorderSerializer(serializers.Serializer):
+    order = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    after = serializers.IntegerField(required=False, allow_null=True)
+
+
+class ChapterRevisionSerializer(serializers.ModelSerializer):
+    editor = serializers.StringRelatedField(read_only=True)  # username
+
+    class Meta:
+        model = ChapterRevision
+        fields = ["number", "title", "is_snapshot", "size", "editor", "created_at"]
+        read_only_fields = fields
+
+
+class FeedItemSerializer(serializers.ModelSerializer):
+    story_title = serializers.CharField(source="story.title", read_only=True)
+    published_at = serializers.DateTimeField(source="created_at", read_only=True)
+
+    class Meta:
+        model = Chapter
+        fields = ["id", "title", "position", "story", "story_title", "published_at"]
+        read_only_fields = fields
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -71,8 +107,34 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ["id", "user", "chapter", "content", "created_at"]
-        read_only_fields = ["user", "created_at"]
+        fields = [
+            "id",
+            "user",
+            "chapter",
+            "parent",
+            "content",
+            "depth",
+            "reply_count",
+            "descendant_count",
+            "created_at",
+        ]
+        read_only_fields = ["user", "depth", "reply_count", "descendant_count", "created_at"]
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            # The thread path is fixed when a comment is posted; moving it would
+            # strand its replies and the ancestors' counters.
+            for field in ("chapter", "parent"):
+                if field in attrs and attrs.pop(field) != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: "Cannot be changed after posting."})
+            return attrs
+        parent = attrs.get("parent")
+        if parent is not None:
+            if parent.chapter_id != attrs["chapter"].pk:
+                raise serializers.ValidationError({"parent": "Reply must be on the same chapter."})
+            if parent.depth + 1 >= Comment.MAX_DEPTH:
+                raise serializers.ValidationError({"parent": "Thread is too deep to reply to."})
+        return attrs
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -84,6 +146,24 @@ class RatingSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "created_at"]
 
 
+class RatingUpsertSerializer(serializers.Serializer):
+    chapter = serializers.IntegerField()
+    value = serializers.IntegerField(min_value=0, max_value=32767)
+
+
+class RatingBatchSerializer(serializers.Serializer):
+    ratings = RatingUpsertSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_ratings(self, items):
+        # Last write wins for repeated chapters; ON CONFLICT can't touch a row twice.
+        latest = {item["chapter"]: item["value"] for item in items}
+        existing = set(Chapter.objects.filter(pk__in=latest).values_list("pk", flat=True))
+        missing = sorted(set(latest) - existing)
+        if missing:
+            raise serializers.ValidationError(f"Unknown chapters: {missing}.")
+        return [{"chapter": chapter, "value": value} for chapter, value in latest.items()]
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
 
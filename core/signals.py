@@ -0,0 +1,72 @@
+# core/signals.py
+"""
+Keep per-worker in-memory structures and comment counters in step with
+model writes.
+Connected in CoreConfig.ready().
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import apply_change, loaded_index
+from .models import Chapter, Comment, Story, Tag, in_subtree_delete
+
+
+@receiver(post_save, sender=Tag)
+def index_tag(sender, instance, **kwargs):
+    apply_change("upsert", "tag", instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Tag)
+def unindex_tag(sender, instance, **kwargs):
+    apply_change("remove", "tag", instance.pk)
+
+
+@receiver(post_save, sender=Story)
+def index_story(sender, instance, created, **kwargs):
+    apply_change("upsert", "story", instance.pk, instance.title, instance.follower_count)
+    if created:
+        apply_change("upsert", "author", instance.author_id, instance.author.username)
+
+
+@receiver(post_delete, sender=Story)
+def unindex_story(sender, instance, **kwargs):
+    apply_change("remove", "story", instance.pk)
+
+
+@receiver(m2m_changed, sender=Story.tags.through)
+def reindex_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    if not pk_set or action not in ("post_add", "post_remove"):
+        return
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        # tag.stories.add(...): instance is the tag, pk_set holds stories
+        apply_change("adjust_score", "tag", instance.pk, delta * len(pk_set))
+    else:
+        for tag_id in pk_set:
+            apply_change("adjust_score", "tag", tag_id, delta)
+
+
+@receiver(post_save, sender=User)
+def reindex_author(sender, instance, **kwargs):
+    # Only users that are already indexed (i.e. have stories) are updated.
+    index = loaded_index()
+    if index is not None and index.has("author", instance.pk):
+        apply_change("upsert", "author", instance.pk, instance.username)
+
+
+@receiver(post_delete, sender=User)
+def unindex_author(sender, instance, **kwargs):
+    apply_change("remove", "author", instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    # Comment.delete() updates the counters once for the whole subtree. Other
+    # deletes (a user's comments, admin bulk deletes) reach here row by row;
+    # each row comes off its surviving ancestors, deleted ones match nothing.
+    if in_subtree_delete.get():
+        return
+    if getattr(origin, "model", type(origin)) in (Chapter, Story):
+        return  # the whole thread goes with its chapter
+    instance.uncount()
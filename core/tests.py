@@ -1,3 +1,511 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from . import autocomplete, covers, db_router, feed
+from .models import Story, Chapter, ChapterRevision, Comment, CoverImage, FeedEntry, Rating, Tag
+from .ordering import POSITION_GAP, _plan
+from .revisions import reconstruct, record_revision
+
+
+class ChapterRevisionTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author", password="pw123456xx")
+        self.story = Story.objects.create(author=self.author, title="S", summary="x")
+        self.client.force_authenticate(self.author)
+
+    def url(self, chapter, suffix=""):
+        return f"/api/stories/{self.story.pk}/chapters/{chapter.pk}/{suffix}"
+
+    def test_first_edit_of_legacy_chapter_keeps_old_text(self):
+        # Created directly, as chapters were before revision history existed.
+        chapter = Chapter.objects.create(story=self.story, title="c", content="original precious text", position=1)
+
+        r = self.client.patch(self.url(chapter), {"content": "oops"})
+
+        self.assertEqual(r.status_code, 200)
+        revisions = [(rev.number, reconstruct(rev)) for rev in chapter.revisions.order_by("number")]
+        self.assertEqual(revisions, [(1, "original precious text"), (2, "oops")])
+
+    def test_restore_round_trip(self):
+        r = self.client.post(f"/api/stories/{self.story.pk}/chapters/", {"title": "c", "content": "one"})
+        chapter = Chapter.objects.get(pk=r.data["id"])
+        for text in ("two", "three"):
+            self.client.patch(self.url(chapter), {"content": text})
+
+        r = self.client.post(self.url(chapter, "revisions/1/restore/"))
+
+        self.assertEqual(r.data["content"], "one")
+        self.assertEqual(ChapterRevision.objects.filter(chapter=chapter).count(), 4)
+
+    def test_diff_of_changed_last_line(self):
+        # DRF trims the trailing newline, so the last line never ends in one.
+        r = self.client.post(f"/api/stories/{self.story.pk}/chapters/", {"title": "c", "content": "a\nb\n"})
+        chapter = Chapter.objects.get(pk=r.data["id"])
+        self.client.patch(self.url(chapter), {"content": "a\nc\n"})
+
+        r = self.client.get(self.url(chapter, "revisions/2/diff/"))
+
+        self.assertEqual(
+            r.data["diff"],
+            "--- r1\n+++ r2\n@@ -1,2 +1,2 @@\n a\n"
+            "-b\n\\ No newline at end of file\n"
+            "+c\n\\ No newline at end of file\n",
+        )
+
+
+class PlanTests(SimpleTestCase):
+    def test_insert_into_gap_moves_one_row(self):
+        rows = [(1, 1024), (2, 2048)]
+        self.assertEqual(_plan(rows, [3], 1), {3: 1536})
+
+    def test_exhausted_gap_rebalances_story(self):
+        rows = [(1, 1024), (2, 1025), (3, 4096)]
+        self.assertEqual(
+            _plan(rows, [3], 1),
+            {2: 3 * POSITION_GAP, 3: 2 * POSITION_GAP},
+        )
+
+
+class ChapterOrderingTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author")
+        self.story = Story.objects.create(author=self.author, title="S", summary="x")
+        self.client.force_authenticate(self.author)
+        self.url = f"/api/stories/{self.story.pk}/chapters/"
+        self.ids = [self.client.post(self.url, {"title": str(i), "content": "x"}).data["id"] for i in range(5)]
+
+    def order(self):
+        return list(self.story.chapters.values_list("id", flat=True))
+
+    def test_single_move_updates_one_row(self):
+        first, *middle, last = self.ids
+
+        r = self.client.post(self.url + "reorder/", {"order": [last], "after": first}, format="json")
+
+        self.assertEqual(r.data["updated"], 1)
+        self.assertEqual(self.order(), [first, last, *middle])
+
+    def test_after_must_be_another_chapter_of_the_story(self):
+        other = Story.objects.create(author=self.author, title="T", summary="x")
+        foreign = Chapter.objects.create(story=other, title="f", content="x", position=1)
+
+        r = self.client.post(self.url, {"title": "n", "content": "x", "after": foreign.pk})
+        self.assertEqual(r.status_code, 400)
+        r = self.client.post(self.url + "reorder/", {"order": [self.ids[0]], "after": self.ids[0]}, format="json")
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(self.order(), self.ids)
+
+    def test_equal_positions_keep_creation_order(self):
+        Chapter.objects.filter(pk__in=self.ids).update(position=1)
+        self.assertEqual(self.order(), self.ids)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], DATABASE_ROUTERS=["core.db_router.ReplicaRouter"])
+class ReplicaRoutingTests(APITransactionTestCase):
+    """
+    A second connection to the test database stands in for a replica, as with
+    a copied SQLite file locally. The alias is added once the test databases
+    exist (so the runner doesn't try to create it) and then allowed in
+    `databases`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        replica = dict(connections["default"].settings_dict)
+        replica["TEST"] = {**replica["TEST"], "MIRROR": "default"}
+        connections.settings["replica_1"] = replica
+        cls.databases = {"default", "replica_1"}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica_1"].close()
+        del connections["replica_1"]
+        del connections.settings["replica_1"]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        db_router._health.clear()
+        self.author = User.objects.create_user("author")
+        Story.objects.create(author=self.author, title="S", summary="x")
+
+    def story_queries(self, alias, method, *args, **kwargs):
+        with CaptureQueriesContext(connections[alias]) as ctx:
+            response = method(*args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return [q["sql"] for q in ctx.captured_queries if "core_story" in q["sql"]]
+
+    def test_anonymous_reads_use_replica(self):
+        with CaptureQueriesContext(connections["default"]) as primary:
+            self.assertTrue(self.story_queries("replica_1", self.client.get, "/api/stories/"))
+        self.assertFalse([q for q in primary.captured_queries if "core_story" in q["sql"]])
+
+    def test_writer_is_pinned_to_primary(self):
+        self.client.force_authenticate(self.author)
+        self.client.post("/api/stories/", {"title": "T", "summary": "x"})
+
+        with CaptureQueriesContext(connections["replica_1"]) as replica:
+            self.assertTrue(self.story_queries("default", self.client.get, "/api/stories/"))
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_failing_replica_falls_back_to_primary(self):
+        # Healthy as far as the last probe knew, but unreachable now.
+        db_router._health["replica_1"] = (True, time.monotonic())
+        with mock.patch.object(connections["replica_1"], "cursor", side_effect=OperationalError("replica down")):
+            self.assertTrue(self.story_queries("default", self.client.get, "/api/stories/"))
+        self.assertFalse(db_router._health["replica_1"][0])
+
+
+class LargeTableAdminTests(APITestCase):
+    def test_changelists_order_by_primary_key(self):
+        admin_user = User.objects.create_superuser("admin")
+        story = Story.objects.create(author=admin_user, title="S", summary="x")
+        record_revision(Chapter.objects.create(story=story, title="c", content="x", position=1))
+        self.client.force_login(admin_user)
+        for model in ("chapter", "chapterrevision"):
+            with CaptureQueriesContext(connections["default"]) as ctx:
+                r = self.client.get(f"/admin/core/{model}/")
+            self.assertEqual(r.status_code, 200)
+            [order_by] = [
+                q["sql"].partition("ORDER BY")[2]
+                for q in ctx.captured_queries
+                if f'FROM "core_{model}"' in q["sql"] and "ORDER BY" in q["sql"]
+            ]
+            self.assertEqual(order_by.split(" LIMIT")[0].strip(), f'"core_{model}"."id" DESC')
+
+    def test_comment_change_form_does_not_list_comments(self):
+        admin_user = User.objects.create_superuser("admin")
+        story = Story.objects.create(author=admin_user, title="S", summary="x")
+        chapter = Chapter.objects.create(story=story, title="c", content="x", position=1)
+        comments = [Comment.objects.create(user=admin_user, chapter=chapter, content="hi") for _ in range(5)]
+        self.client.force_login(admin_user)
+
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            r = self.client.get(f"/admin/core/comment/{comments[0].pk}/change/")
+
+        self.assertEqual(r.status_code, 200)
+        # A <select> for `parent` would load every comment (no LIMIT).
+        unbounded = [
+            q for q in ctx.captured_queries if q["sql"].startswith('SELECT "core_comment"') and "LIMIT" not in q["sql"]
+        ]
+        self.assertEqual(unbounded, [])
+
+
+class FeedTests(APITestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user("reader")
+        author = User.objects.create_user("author")
+        self.small = Story.objects.create(author=author, title="Small", summary="x")
+        self.big = Story.objects.create(author=author, title="Big", summary="x")
+        for story in (self.small, self.big):
+            feed.follow_story(self.reader, story)
+        feed.follow_story(User.objects.create_user("other"), self.big)
+        self.big.refresh_from_db()
+        self.client.force_authenticate(self.reader)
+
+    def publish(self, story, n):
+        chapters = []
+        for i in range(n):
+            chapter = Chapter.objects.create(story=story, title=str(i), content="x", position=i + 1)
+            feed.fan_out_chapter(chapter)
+            chapters.append(chapter)
+        return chapters
+
+    def test_fan_out_inserts_in_batches(self):
+        for i in range(4):
+            feed.follow_story(User.objects.create_user(f"f{i}"), self.small)
+        chapter = Chapter.objects.create(story=self.small, title="c", content="x", position=1)
+
+        with mock.patch.object(feed, "FANOUT_BATCH_SIZE", 2), CaptureQueriesContext(connections["default"]) as ctx:
+            written = feed.fan_out_chapter(chapter)
+
+        self.assertEqual(written, 5)
+        inserts = [q for q in ctx.captured_queries if 'INTO "core_feedentry"' in q["sql"]]
+        self.assertEqual(len(inserts), 3)
+
+    def test_big_story_is_pulled_and_pages_merge_both_sources(self):
+        with mock.patch.object(feed, "FANOUT_MAX_FOLLOWERS", 1):
+            chapters = self.publish(self.small, 4) + self.publish(self.big, 4)
+            self.assertFalse(FeedEntry.objects.filter(chapter__story=self.big).exists())
+
+            seen, cursor = [], None
+            while True:
+                params = {"limit": 3, **({"before": cursor} if cursor else {})}
+                r = self.client.get("/api/feed/", params)
+                seen += [item["id"] for item in r.data["results"]]
+                cursor = r.data["next"]
+                if cursor is None:
+                    break
+
+        expected = [c.pk for c in sorted(chapters, key=lambda c: (c.created_at, c.pk), reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_out_of_range_cursor_is_rejected(self):
+        r = self.client.get("/api/feed/", {"before": "99999999999999999999999_1"})
+        self.assertEqual(r.status_code, 400)
+
+
+class RatingUpsertTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+        story = Story.objects.create(author=self.user, title="S", summary="x")
+        self.chapters = [
+            Chapter.objects.create(story=story, title=str(i), content="x", position=i + 1) for i in range(2)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def test_rerating_updates_the_same_row(self):
+        chapter = self.chapters[0].pk
+        first = self.client.post("/api/ratings/upsert/", {"chapter": chapter, "value": 3}).data
+        second = self.client.post("/api/ratings/upsert/", {"chapter": chapter, "value": 5}).data
+
+        self.assertEqual(second, {"id": first["id"], "chapter": chapter, "value": 5})
+        self.assertEqual(list(Rating.objects.values_list("chapter", "value")), [(chapter, 5)])
+
+    def test_batch_keeps_last_value_per_chapter(self):
+        a, b = (c.pk for c in self.chapters)
+        ratings = [{"chapter": a, "value": 1}, {"chapter": b, "value": 2}, {"chapter": a, "value": 4}]
+
+        r = self.client.post("/api/ratings/batch/", {"ratings": ratings}, format="json")
+
+        self.assertEqual(r.data["count"], 2)
+        self.assertEqual(dict(Rating.objects.values_list("chapter", "value")), {a: 4, b: 2})
+
+    def test_batch_with_unknown_chapter_writes_nothing(self):
+        ratings = [{"chapter": self.chapters[0].pk, "value": 1}, {"chapter": 999999, "value": 2}]
+
+        r = self.client.post("/api/ratings/batch/", {"ratings": ratings}, format="json")
+
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("999999", str(r.data))
+        self.assertFalse(Rating.objects.exists())
+
+
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader")
+        story = Story.objects.create(author=self.user, title="S", summary="x")
+        self.chapter = Chapter.objects.create(story=story, title="c", content="x", position=1)
+        self.client.force_authenticate(self.user)
+
+    def reply(self, parent=None):
+        return Comment.objects.create(user=self.user, chapter=self.chapter, parent=parent, content="hi")
+
+    def test_replies_set_path_depth_and_ancestor_counters(self):
+        root = self.reply()
+        child = self.reply(root)
+        self.reply(child)
+        self.reply(root)
+
+        root.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual((root.depth, root.reply_count, root.descendant_count), (0, 2, 3))
+        self.assertEqual((child.depth, child.reply_count, child.descendant_count), (1, 1, 1))
+        self.assertEqual(child.ancestor_ids(), [root.pk])
+        self.assertTrue(child.path.startswith(root.path))
+
+    def test_thread_lists_subtree_in_order(self):
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        sibling = self.reply(root)
+        self.reply()  # another thread
+
+        r = self.client.get(f"/api/comments/{root.pk}/thread/")
+
+        ids = [c["id"] for c in r.data.get("results", r.data)]
+        self.assertEqual(ids, [root.pk, child.pk, grandchild.pk, sibling.pk])
+
+    def test_deleting_a_reply_removes_its_subtree_and_fixes_counters(self):
+        root = self.reply()
+        child = self.reply(root)
+        self.reply(child)
+        keep = self.reply(root)
+
+        r = self.client.delete(f"/api/comments/{child.pk}/")
+
+        self.assertEqual(r.status_code, 204)
+        self.assertEqual(list(Comment.objects.values_list("pk", flat=True).order_by("pk")), [root.pk, keep.pk])
+        root.refresh_from_db()
+        self.assertEqual((root.reply_count, root.descendant_count), (1, 1))
+
+    def test_cascade_deletes_keep_ancestor_counters(self):
+        replier = User.objects.create_user("replier")
+        root = self.reply()
+        child = Comment.objects.create(user=replier, chapter=self.chapter, parent=root, content="hi")
+        self.reply(child)
+        keep = self.reply(root)
+        self.reply(keep)
+
+        replier.delete()  # cascades to `child` and, through it, its reply
+        root.refresh_from_db()
+        self.assertEqual((root.reply_count, root.descendant_count), (1, 2))
+
+        Comment.objects.filter(pk=keep.pk).delete()  # e.g. the admin's "delete selected"
+        root.refresh_from_db()
+        self.assertEqual((root.reply_count, root.descendant_count), (0, 0))
+
+        with CaptureQueriesContext(connections["default"]) as ctx:
+            self.chapter.delete()
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "core_comment"')])
+
+    def test_parent_cannot_be_changed(self):
+        root = self.reply()
+        child = self.reply(root)
+
+        r = self.client.patch(f"/api/comments/{child.pk}/", {"parent": None}, format="json")
+
+        self.assertEqual(r.status_code, 400)
+        child.refresh_from_db()
+        self.assertEqual(child.parent_id, root.pk)
+
+    def test_edit_keeps_thread_position(self):
+        root = self.reply()
+        child = self.reply(root)
+
+        r = self.client.patch(f"/api/comments/{child.pk}/", {"content": "edited", "parent": root.pk})
+
+        self.assertEqual(r.status_code, 200)
+        child.refresh_from_db()
+        self.assertEqual((child.content, child.parent_id), ("edited", root.pk))
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def test_short_prefix_ranking_follows_score_changes(self):
+        index = autocomplete.PrefixIndex.from_rows([("story", 1, "Alpha", 5), ("story", 2, "Alps", 3)])
+        self.assertEqual(index.lookup("al")["story"], [(1, "Alpha"), (2, "Alps")])
+
+        index.adjust_score("story", 2, 10)
+        index.upsert("story", 3, "Altitude", 9)
+
+        self.assertEqual(index.lookup("al")["story"], [(2, "Alps"), (3, "Altitude"), (1, "Alpha")])
+        self.assertEqual(index.lookup("alp")["story"], [(2, "Alps"), (1, "Alpha")])
+
+    def test_truncated_ranking_refills_after_removals(self):
+        n = autocomplete.TOP_KEEP + 10
+        index = autocomplete.PrefixIndex.from_rows([("tag", pk, f"t{pk:03}", pk) for pk in range(n)])
+        for pk in range(n - 1, n - 1 - autocomplete.TOP_KEEP, -1):
+            index.remove("tag", pk)
+
+        self.assertEqual([pk for pk, _ in index.lookup("t", limit=5)["tag"]], [9, 8, 7, 6, 5])
+
+
+class AutocompleteIndexTests(APITestCase):
+    def setUp(self):
+        autocomplete.reset_index()
+        self.author = User.objects.create_user("author")
+        self.story = Story.objects.create(author=self.author, title="The Wandering Inn", summary="x")
+
+    def tearDown(self):
+        autocomplete.reset_index()
+
+    def test_follow_updates_score_without_rebuild(self):
+        index = autocomplete.get_index()
+        reader = User.objects.create_user("reader")
+        self.client.force_authenticate(reader)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/stories/{self.story.pk}/follow/")
+
+        self.assertIs(autocomplete.get_index(), index)
+        self.assertEqual(index._items[("story", self.story.pk)][1], 1)
+
+    def test_stale_index_is_rebuilt_in_background_and_keeps_changes(self):
+        index = autocomplete.get_index()
+        autocomplete._built_at -= autocomplete.REBUILD_SECONDS + 1
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_build():
+            # Stands in for the database read; the tag below is created after it.
+            started.set()
+            release.wait(5)
+            return autocomplete.PrefixIndex.from_rows([("story", self.story.pk, self.story.title, 0)])
+
+        with mock.patch.object(autocomplete, "build_index", slow_build):
+            # Served immediately from the stale index while the rebuild runs.
+            self.assertIs(autocomplete.get_index(), index)
+            self.assertTrue(started.wait(5))
+            Tag.objects.create(name="Fantasy")  # lands while the build is in flight
+            release.set()
+            for _ in range(100):
+                if autocomplete.loaded_index() is not index:
+                    break
+                time.sleep(0.01)
+
+        fresh = autocomplete.loaded_index()
+        self.assertIsNot(fresh, index)
+        self.assertEqual([label for _, label in fresh.lookup("fan")["tag"]], ["Fantasy"])
+
+
+class CoverTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.author = User.objects.create_user("author")
+        self.client.force_authenticate(self.author)
+
+    def png(self, size=(1200, 600)):
+        buf = io.BytesIO()
+        Image.new("RGB", size, "teal").save(buf, "PNG")
+        return buf.getvalue()
+
+    def upload(self, story, data):
+        return self.client.post(
+            f"/api/stories/{story.pk}/cover/",
+            {"image": SimpleUploadedFile("cover.png", data, "image/png")},
+            format="multipart",
+        )
+
+    def test_same_image_is_stored_once(self):
+        data = self.png()
+        stories = [Story.objects.create(author=self.author, title=t, summary="x") for t in "AB"]
+
+        for story in stories:
+            self.assertEqual(self.upload(story, data).status_code, 200)
+
+        cover = CoverImage.objects.get()
+        self.assertEqual(set(Story.objects.values_list("cover", flat=True)), {cover.pk})
+
+    def test_reupload_retries_failed_variants(self):
+        data = self.png()
+        story = Story.objects.create(author=self.author, title="A", summary="x")
+        self.upload(story, data)
+        CoverImage.objects.update(status=CoverImage.FAILED)
+
+        with mock.patch.object(covers, "queue_variants") as queue, self.captureOnCommitCallbacks(execute=True):
+            self.upload(story, data)
+
+        cover = CoverImage.objects.get()
+        self.assertEqual(cover.status, CoverImage.PENDING)
+        queue.assert_called_once_with(cover.pk)
+
+    def test_generate_variants_renders_every_size_and_format(self):
+        cover = covers.store_upload(SimpleUploadedFile("cover.png", self.png(), "image/png"))
+
+        covers.generate_variants(cover)
+
+        cover.refresh_from_db()
+        self.assertEqual(cover.status, CoverImage.READY)
+        self.assertEqual(set(cover.variants), set(covers.VARIANT_WIDTHS))
+        for label, max_width in covers.VARIANT_WIDTHS.items():
+            self.assertEqual(set(cover.variants[label]), set(covers.VARIANT_FORMATS))
+            for ext, name in cover.variants[label].items():
+                with covers.default_storage.open(name) as fh, Image.open(fh) as img:
+                    self.assertEqual(img.format, covers.VARIANT_FORMATS[ext][0])
+                    self.assertEqual(img.size, (min(max_width, 1200), min(max_width, 1200) // 2))
@@ -1,11 +1,17 @@
 # core/views.py
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.shortcuts import get_object_or_404
+from django.views.static import serve
+from django.db import DatabaseError, transaction
 from django.db.models import Avg
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -15,15 +21,76 @@ from .serializers import (
     TagSerializer,
     StorySerializer,
     ChapterSerializer,
+    ChapterRevisionSerializer,
+    ChapterReorderSerializer,
+    FeedItemSerializer,
     CommentSerializer,
     RatingSerializer,
+    RatingUpsertSerializer,
+    RatingBatchSerializer,
     RegisterSerializer,
     UserSerializer,
 )
-from .permissions import IsOwnerOnly, IsStoryOwnerFromURLOrReadOnly
+from .permissions import IsOwnerOnly, IsStoryOwnerFromURLOrReadOnly, IsStoryOwnerFromURL
+from .revisions import record_revision, reconstruct, unified_diff
+from .ordering import move_chapters, position_for_new_chapter
+from .autocomplete import KINDS, MAX_LIMIT, get_index
+from .covers import InvalidCover, store_upload
+from .feed import decode_cursor, encode_cursor, fan_out_chapter, feed_page, follow_story, unfollow_story
+from .db_router import (
+    choose_replica,
+    is_pinned_to_primary,
+    mark_unhealthy,
+    pin_user_to_primary,
+    reset_read_alias,
+    use_read_alias,
+)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class ReplicaRoutingMixin:
+    """
+    Send safe requests to a read replica (if any are configured and healthy),
+    except for users who wrote within the last REPLICA_PIN_SECONDS.
+    Successful writes pin the user to the primary. If a replica fails during a
+    safe request, it is marked unhealthy and the request is retried on the primary.
+    Set replica_reads = False to only record writes.
+    """
+    replica_reads = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.replica_reads
+            and request.method in SAFE_METHODS
+            and not is_pinned_to_primary(request.user)
+        ):
+            self._replica_alias = choose_replica()
+            use_read_alias(self._replica_alias)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_alias = None
+        token = use_read_alias(None)
+        try:
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            except DatabaseError:
+                if not self._replica_alias:
+                    raise
+                mark_unhealthy(self._replica_alias)
+                use_read_alias(None)
+                self._replica_alias = None
+                self.replica_reads = False
+                return super().dispatch(request, *args, **kwargs)
+        finally:
+            reset_read_alias(token)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_user_to_primary(getattr(request, "user", None))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class TagViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     Public read; auth required to create/update/delete.
     Returns a plain list (no pagination) for convenience on the frontend.
@@ -38,7 +105,7 @@ class TagViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated()]
 
 
-class StoryViewSet(viewsets.ModelViewSet):
+class StoryViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     Stories with average rating.
     - Read: public
@@ -58,7 +125,7 @@ class StoryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Stable ordering to avoid UnorderedObjectListWarning during pagination
         return (
-            Story.objects.select_related("author")
+            Story.objects.select_related("author", "cover")
             .prefetch_related("tags")
             .annotate(average_rating=Avg("chapters__ratings__value"))
             .order_by("-created_at", "-id")
@@ -69,11 +136,51 @@ class StoryViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         if self.action in ["update", "partial_update", "destroy"]:
             return [IsAuthenticated(), IsOwnerOnly()]
-        return [permissions.AllowAny()]
+        if self.action in ["list", "retrieve"]:
+            return [permissions.AllowAny()]
+        # Extra actions (mine, follow, cover) declare their own permission_classes.
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=True, methods=["post", "delete"], permission_classes=[IsAuthenticated])
+    def follow(self, request, pk=None):
+        """POST to follow, DELETE to unfollow: /api/stories/<pk>/follow/"""
+        story = get_object_or_404(Story, pk=pk)
+        if request.method == "POST":
+            changed = follow_story(request.user, story)
+        else:
+            changed = unfollow_story(request.user, story)
+        story.refresh_from_db(fields=["follower_count"])
+        return Response(
+            {"story": story.pk, "following": request.method == "POST", "changed": changed,
+             "follower_count": story.follower_count}
+        )
+
+    @action(detail=True, methods=["post", "delete"], permission_classes=[IsAuthenticated, IsOwnerOnly])
+    def cover(self, request, pk=None):
+        """
+        POST multipart {"image": <file>} to set the cover, DELETE to clear it.
+        The upload is spooled to a temp file, not memory; resized variants
+        appear in `cover.variants` once the background job has run.
+        """
+        # Must happen before request.data is parsed.
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+        story = self.get_object()
+        if request.method == "DELETE":
+            story.cover = None
+        else:
+            image = request.FILES.get("image")
+            if image is None:
+                raise ValidationError({"image": "This field is required."})
+            try:
+                story.cover = store_upload(image)
+            except InvalidCover as e:
+                raise ValidationError({"image": str(e)})
+        story.save(update_fields=["cover", "updated_at"])
+        return Response(self.get_serializer(self.get_queryset().get(pk=story.pk)).data)
+
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def mine(self, request):
         qs = self.get_queryset().filter(author=request.user)
@@ -85,12 +192,22 @@ class StoryViewSet(viewsets.ModelViewSet):
         return Response(ser.data)
 
 
-class ChapterViewSet(viewsets.ModelViewSet):
+class ChapterViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     Chapters are nested under a story:
       /api/stories/<story_pk>/chapters/
     - Read: public
     - Create/Update/Destroy: ONLY story author
+    `position` is a sparse sort key (see core/ordering.py). On create it may be
+    omitted to append, or replaced by {"after": <chapter id>} to insert.
+      POST .../chapters/reorder/  {"order": [ids...], "after": <id|null>}
+        moves the listed chapters, in that order, after `after` (or to the start).
+        Listing every chapter with no `after` sets a full new ordering.
+    Revision history (story author only):
+      GET  .../chapters/<pk>/revisions/                         list
+      GET  .../chapters/<pk>/revisions/<n>/                     full text of revision n
+      GET  .../chapters/<pk>/revisions/<n>/diff/?against=<m>    unified diff (default: previous revision)
+      POST .../chapters/<pk>/revisions/<n>/restore/             make revision n current again
     """
     serializer_class = ChapterSerializer
     permission_classes = [IsStoryOwnerFromURLOrReadOnly]
@@ -105,15 +222,116 @@ class ChapterViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         story_pk = self.kwargs.get("story_pk")
         story = get_object_or_404(Story, pk=story_pk)
-        serializer.save(story=story)
-
+        after = serializer.validated_data.pop("after", None)
+        with transaction.atomic():
+            if after is not None or "position" not in serializer.validated_data:
+                try:
+                    serializer.validated_data["position"] = position_for_new_chapter(story.pk, after)
+                except ValueError as e:
+                    raise ValidationError({"after": str(e)})
+            chapter = serializer.save(story=story)
+            record_revision(chapter, self.request.user)
+            transaction.on_commit(lambda: fan_out_chapter(chapter))
+
+    def perform_update(self, serializer):
+        serializer.validated_data.pop("after", None)
+        with transaction.atomic():
+            if not serializer.instance.revisions.exists():
+                # Chapters written before revision history existed: keep the
+                # text being overwritten as their first revision.
+                record_revision(serializer.instance)
+            chapter = serializer.save()
+            record_revision(chapter, self.request.user)
+
+    @action(detail=False, methods=["post"])
+    def reorder(self, request, story_pk=None):
+        get_object_or_404(Story, pk=story_pk)
+        ser = ChapterReorderSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        try:
+            updated = move_chapters(story_pk, ser.validated_data["order"], ser.validated_data.get("after"))
+        except ValueError as e:
+            raise ValidationError({"order": str(e)})
+        order = Chapter.objects.filter(story_id=story_pk).order_by("position", "id").values("id", "position")
+        return Response({"updated": updated, "order": list(order)})
+
+    def _get_revision(self, chapter, number):
+        return get_object_or_404(chapter.revisions, number=number)
+
+    @action(detail=True, methods=["get"], permission_classes=[IsStoryOwnerFromURL])
+    def revisions(self, request, story_pk=None, pk=None):
+        chapter = self.get_object()
+        qs = chapter.revisions.select_related("editor").order_by("-number")
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(ChapterRevisionSerializer(page, many=True).data)
+        return Response(ChapterRevisionSerializer(qs, many=True).data)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"revisions/(?P<number>\d+)",
+        permission_classes=[IsStoryOwnerFromURL],
+    )
+    def revision(self, request, story_pk=None, pk=None, number=None):
+        chapter = self.get_object()
+        rev = self._get_revision(chapter, number)
+        data = ChapterRevisionSerializer(rev).data
+        data["content"] = reconstruct(rev)
+        return Response(data)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"revisions/(?P<number>\d+)/diff",
+        permission_classes=[IsStoryOwnerFromURL],
+    )
+    def revision_diff(self, request, story_pk=None, pk=None, number=None):
+        chapter = self.get_object()
+        rev = self._get_revision(chapter, number)
+        against = request.query_params.get("against")
+        if against is not None:
+            if not against.isdigit():
+                raise ValidationError({"against": "Must be a revision number."})
+            base = self._get_revision(chapter, against)
+        else:
+            base = chapter.revisions.filter(number__lt=rev.number).order_by("-number").first()
+        base_text = reconstruct(base) if base else ""
+        return Response(
+            {
+                "from": base.number if base else None,
+                "to": rev.number,
+                "diff": unified_diff(base, base_text, rev, reconstruct(rev)),
+            }
+        )
 
-class CommentViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path=r"revisions/(?P<number>\d+)/restore",
+        permission_classes=[IsStoryOwnerFromURL],
+    )
+    def restore_revision(self, request, story_pk=None, pk=None, number=None):
+        chapter = self.get_object()
+        rev = self._get_revision(chapter, number)
+        with transaction.atomic():
+            chapter.title = rev.title
+            chapter.content = reconstruct(rev)
+            chapter.save(update_fields=["title", "content", "updated_at"])
+            record_revision(chapter, request.user)
+        return Response(self.get_serializer(chapter).data)
+
+
+class CommentViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     Comments: read public; create requires auth.
     Works with:
       - /api/stories/<story_pk>/chapters/<chapter_pk>/comments/   (nested)
       - /api/comments/ with {"chapter": <id>}                      (flat, if routed)
+    Threads: create with {"parent": <comment id>} to reply.
+      ?top_level=1          only root comments (with reply/descendant counts)
+      .../<pk>/thread/      the comment plus its whole subtree, in thread order
+                            (?max_depth=<n> limits depth relative to <pk>)
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -135,8 +353,24 @@ class CommentViewSet(viewsets.ModelViewSet):
             qs = qs.select_related(rel_author)
         if chapter_pk:
             qs = qs.filter(chapter_id=chapter_pk)
+        if self.request.query_params.get("top_level") in ("1", "true"):
+            qs = qs.filter(parent__isnull=True)
         return qs.order_by("-created_at", "-id")
 
+    @action(detail=True, methods=["get"])
+    def thread(self, request, pk=None, **kwargs):
+        root = self.get_object()
+        qs = root.subtree().select_related("user").order_by("path")
+        max_depth = request.query_params.get("max_depth")
+        if max_depth is not None:
+            if not max_depth.isdigit():
+                raise ValidationError({"max_depth": "Must be a non-negative integer."})
+            qs = qs.filter(depth__lte=root.depth + int(max_depth))
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(qs, many=True).data)
+
     def create(self, request, *args, **kwargs):
         """
         Inject the chapter id into the serializer data BEFORE validation,
@@ -170,10 +404,12 @@ class CommentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(ReplicaRoutingMixin, viewsets.ModelViewSet):
     """
     Ratings: anyone can read; authenticated users can create/update their ratings.
+    Reads stay on the primary; writes pin the user there (they feed story averages).
     """
+    replica_reads = False
     serializer_class = RatingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -183,6 +419,36 @@ class RatingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def _upsert(self, items):
+        """
+        Insert-or-update the user's ratings in one INSERT ... ON CONFLICT DO UPDATE.
+        Ratings carry no stored aggregates (averages are computed on read), so
+        nothing else needs updating.
+        """
+        ratings = Rating.objects.bulk_create(
+            [Rating(user=self.request.user, chapter_id=i["chapter"], value=i["value"]) for i in items],
+            update_conflicts=True,
+            unique_fields=["user", "chapter"],
+            update_fields=["value"],
+        )
+        return [{"id": r.pk, "chapter": r.chapter_id, "value": r.value} for r in ratings]
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def upsert(self, request):
+        """POST /api/ratings/upsert/ {"chapter": <id>, "value": <n>} — create or replace my rating."""
+        ser = RatingUpsertSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        get_object_or_404(Chapter.objects.only("id"), pk=ser.validated_data["chapter"])
+        return Response(self._upsert([ser.validated_data])[0])
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def batch(self, request):
+        """POST /api/ratings/batch/ {"ratings": [{"chapter": <id>, "value": <n>}, ...]}"""
+        ser = RatingBatchSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        ratings = self._upsert(ser.validated_data["ratings"])
+        return Response({"count": len(ratings), "ratings": ratings})
+
     @action(detail=False, url_path=r"chapter/(?P<chapter_id>[^/.]+)/average")
     def by_chapter(self, request, chapter_id=None):
         avg = Rating.objects.filter(chapter_id=chapter_id).aggregate(Avg("value"))["value__avg"] or 0
@@ -213,6 +479,65 @@ class RegisterView(APIView):
         )
 
 
+class FeedView(APIView):
+    """
+    New chapters from followed stories, newest first.
+    GET /api/feed/?limit=<n>&before=<cursor>; pass back `next` as `before`.
+    """
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), self.max_limit)
+            before = request.query_params.get("before")
+            before = decode_cursor(before) if before else None
+        except ValueError:
+            raise ValidationError({"detail": "Invalid limit or cursor."})
+        if limit < 1:
+            raise ValidationError({"limit": "Must be positive."})
+
+        rows = feed_page(request.user, limit, before)
+        chapters = Chapter.objects.select_related("story").only(
+            "id", "title", "position", "created_at", "story__id", "story__title"
+        ).in_bulk([chapter_id for chapter_id, _ in rows])
+        items = [chapters[chapter_id] for chapter_id, _ in rows if chapter_id in chapters]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return Response({"results": FeedItemSerializer(items, many=True).data, "next": next_cursor})
+
+
+class AutocompleteView(APIView):
+    """
+    Typeahead for the search box, served from an in-memory prefix index.
+    GET /api/autocomplete/?q=<prefix>&types=tag,story,author&limit=<n>
+    -> {"tag": [[id, name], ...], "story": [[id, title], ...], "author": [[id, username], ...]}
+    Public and unauthenticated, so no token decoding on every keystroke.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        types = request.query_params.get("types")
+        kinds = [k for k in types.split(",") if k in KINDS] if types else list(KINDS)
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 8)), MAX_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        results = get_index().lookup(request.query_params.get("q", ""), kinds, limit)
+        return Response({kind: [list(item) for item in items] for kind, items in results.items()})
+
+
+def cover_file(request, path):
+    """
+    Serve files under MEDIA_ROOT/covers/ during development (routed only when
+    DEBUG, like django.conf.urls.static). Their names embed the content hash,
+    so they are cached for a year as immutable.
+    """
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, "covers"))
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -0,0 +1,77 @@
+# royalroad_clone/db_tuning.py
+"""
+Settings-driven database tuning, applied to every entry in DATABASES.
+
+SQLite (local / small deployments):
+  WAL journal, synchronous=NORMAL, memory-mapped I/O, a bigger page cache and a
+  busy timeout, run on every new connection via OPTIONS["init_command"].
+  Transactions start as IMMEDIATE so concurrent writers queue on the busy
+  timeout instead of failing with "database is locked" on lock upgrade.
+  journal_mode=WAL is stored in the file itself: the first connection rewrites
+  the header of the checked-in db.sqlite3, which then shows up as modified in
+  git. Run with DB_TUNING=0 to keep it untouched.
+
+Postgres:
+  Django's native connection pool (OPTIONS["pool"], needs psycopg 3 with
+  psycopg_pool). Pooling requires CONN_MAX_AGE = 0; CONN_HEALTH_CHECKS makes
+  the pool check connections as they are handed out. Without psycopg_pool we
+  keep persistent connections (CONN_MAX_AGE) with CONN_HEALTH_CHECKS.
+
+Env knobs (all optional):
+  DB_TUNING=0                 leave DATABASES untouched
+  DB_POOL=0                   don't use the Postgres pool
+  DB_POOL_MIN_SIZE=1  DB_POOL_MAX_SIZE=4  DB_POOL_TIMEOUT=10
+  SQLITE_SYNCHRONOUS=NORMAL   SQLITE_MMAP_SIZE=268435456
+  SQLITE_CACHE_SIZE_KB=65536  SQLITE_BUSY_TIMEOUT_MS=5000
+"""
+import importlib.util
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def sqlite_pragmas():
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={_env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)}",
+        # Negative cache_size is in KiB rather than pages.
+        f"PRAGMA cache_size=-{_env_int('SQLITE_CACHE_SIZE_KB', 64 * 1024)}",
+        f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _tune_sqlite(db):
+    options = db.setdefault("OPTIONS", {})
+    options.setdefault("init_command", ";".join(sqlite_pragmas()))
+    options.setdefault("transaction_mode", "IMMEDIATE")
+
+
+def _tune_postgres(db):
+    db["CONN_HEALTH_CHECKS"] = True
+    if os.getenv("DB_POOL", "1") != "1" or importlib.util.find_spec("psycopg_pool") is None:
+        return
+    pool = {
+        "min_size": _env_int("DB_POOL_MIN_SIZE", 1),
+        "max_size": _env_int("DB_POOL_MAX_SIZE", 4),
+        "timeout": _env_int("DB_POOL_TIMEOUT", 10),
+    }
+    # CONN_HEALTH_CHECKS already makes Django pass check=ConnectionPool.check_connection.
+    db.setdefault("OPTIONS", {})["pool"] = pool
+    db["CONN_MAX_AGE"] = 0  # required by Django when pooling
+
+
+def tune_databases(databases):
+    """Apply the tuning above in place to a DATABASES dict and return it."""
+    if os.getenv("DB_TUNING", "1") != "1":
+        return databases
+    for db in databases.values():
+        engine = db.get("ENGINE", "")
+        if engine.endswith("sqlite3"):
+            _tune_sqlite(db)
+        elif engine.endswith("postgresql"):
+            _tune_postgres(db)
+    return databases
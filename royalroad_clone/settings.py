@@ -10,6 +10,8 @@ Docs:
 from pathlib import Path
 import os
 
+from .db_tuning import tune_databases
+
 try:
     import dj_database_url  # optional (used if DATABASE_URL is provided)
 except Exception:
@@ -87,6 +89,41 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and dj_database_url:
     DATABASES["default"] = dj_database_url.parse(DATABASE_URL, conn_max_age=600)
 
+
+def _parse_replica_url(url):
+    if dj_database_url:
+        return dj_database_url.parse(url, conn_max_age=600)
+    if url.startswith("sqlite:///"):
+        return {"ENGINE": "django.db.backends.sqlite3", "NAME": url[len("sqlite:///"):]}
+    raise ValueError(f"Cannot parse replica URL without dj_database_url: {url}")
+
+
+# --- Read replicas ---
+# Comma-separated URLs, e.g. "postgres://ro1/...,postgres://ro2/...".
+# Locally, a copy of the SQLite file works as a stand-in:
+#   cp db.sqlite3 replica.sqlite3
+#   DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3 python manage.py runserver
+# Safe requests on the story/chapter/comment/tag APIs then read from it
+# (see core/db_router.py).
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",")):
+    if not _url:
+        continue
+    _alias = f"replica_{_i + 1}"
+    DATABASES[_alias] = {**_parse_replica_url(_url), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(_alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+
+# Connection pooling (Postgres) and WAL/pragmas (SQLite); see db_tuning.py.
+tune_databases(DATABASES)
+
+# Keep a user on the primary this long after they write (read-your-writes).
+# The pin is stored in the cache, so use a shared cache with multiple workers.
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# How often each worker re-probes a replica's health.
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "10"))
+
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -1,5 +1,6 @@
 # royalroad_clone/settings_prod.py
 from .settings import *  # noqa
+from .db_tuning import tune_databases
 import os
 from urllib.parse import urlparse
 
@@ -32,6 +33,10 @@ _mw.insert(i, "whitenoise.middleware.WhiteNoiseMiddleware")
 MIDDLEWARE = _mw
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Uploaded media is not served by Django here. Serve MEDIA_URL from the web
+# server or a CDN; files under covers/ are named by content hash, so send
+# "Cache-Control: public, max-age=31536000, immutable" for them.
+
 # Database from DATABASE_URL
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if DATABASE_URL:
@@ -50,6 +55,7 @@ if DATABASE_URL:
                 "PORT": str(u.port or 5432),
                 "CONN_MAX_AGE": 600,
             }
+    tune_databases(DATABASES)
 
 # Security (HTTPS on Render proxies)
 SECURE_SSL_REDIRECT = True
@@ -1,4 +1,5 @@
 # royalroad_clone/urls.py
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -13,6 +14,9 @@ from core.views import (
     RatingViewSet,
     RegisterView,
     MeView,
+    FeedView,
+    AutocompleteView,
+    cover_file,
 )
 
 router = DefaultRouter()
@@ -40,6 +44,16 @@ urlpatterns = [
     # Auth & profile
     path("api/register/", RegisterView.as_view(), name="register"),
     path("api/me/", MeView.as_view(), name="me"),
+    path("api/feed/", FeedView.as_view(), name="feed"),
+    path("api/autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
+
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
 ]
+
+if settings.DEBUG:
+    # Content-addressed cover images (immutable cache headers). In production
+    # MEDIA_URL is served by the web server / CDN, not by Django.
+    urlpatterns.append(
+        path(f"{settings.MEDIA_URL.strip('/')}/covers/<path:path>", cover_file, name="cover-file")
+    )
@@ -299,10 +299,11 @@ export default function StoryPage() {
           <h2>Chapters ({chapterCount})</h2>
           {chapters.length ? (
             <ol style={{ paddingLeft: '1.25rem' }}>
-              {chapters.map((c) => (
+              {chapters.map((c, i) => (
                 <li key={c.id} style={{ margin: '.35rem 0' }}>
                   <Link to={`/stories/${storyId}/chapters/${c.id}`}>{c.title}</Link>
-                  {typeof c.position === 'number' && <span className="muted"> — {c.position}</span>}
+                  {/* position is a sparse sort key, so show the chapter's index instead */}
+                  <span className="muted"> — {i + 1}</span>
                 </li>
               ))}
             </ol>